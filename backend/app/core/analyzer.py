@@ -1,18 +1,314 @@
 import os
 import re
+import asyncio
 import ast
+import logging
 import hashlib
 import socket
 import ssl
+import subprocess
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import datetime
-from typing import Dict, Any, List, Set, Optional, Callable
+from collections import defaultdict, deque
+from typing import Dict, Any, List, Set, Optional, Callable, Deque, Iterator, Tuple
+from app.core import cache
+from app.core.fswalk import parallel_walk
 from app.core.brain import ArchonBrain
 from app.core.recommender import TechStackRecommender
 
+logger = logging.getLogger(__name__)
+
+# Prompt budget for the semantic layer. Groq meters Llama tokens; ~4 chars per
+# token is a close enough estimate for source code without shipping a tokenizer.
+_CONTEXT_TOKEN_BUDGET = 7000
+_CHARS_PER_TOKEN = 4
+_MAX_SAMPLES = 15
+
+# Only the most recent log lines are kept in the report
+_MAX_LOGS = 5000
+
+# Below this many uncached files, process pool start-up costs more than it saves
+_PARALLEL_MIN_FILES = 200
+
+# Files read, looked up and scanned per batch; bounds the contents held at once
+_SCAN_CHUNK = 512
+
+# Source extension -> language, resolved with one lookup per file
+_EXT_LANGUAGES = {
+    ".py": "Python",
+    ".js": "JavaScript/TypeScript", ".jsx": "JavaScript/TypeScript",
+    ".ts": "JavaScript/TypeScript", ".tsx": "JavaScript/TypeScript",
+    ".go": "Go",
+    ".rs": "Rust",
+    ".java": "Java",
+}
+
+def _estimate_tokens(text: str) -> int:
+    """Approximate the token count of a prompt fragment."""
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+# Vendored, generated and VCS directories: never source, pruned from every walk
+SKIP_DIRS = frozenset({
+    ".git", "node_modules", ".venv", "venv", "__pycache__",
+    "dist", "build", ".next", ".mypy_cache",
+})
+
+# Files some layer reads the content of; the rest matter to the report by
+# path alone. Keep in step with the layers' file selectors.
+_CONTENT_SUFFIXES = (
+    ".py", ".java", ".php", ".rb", ".go", ".rs", ".js", ".ts", ".tsx",
+    ".tf", ".env", ".yml", ".yaml", ".json", ".txt", ".conf",
+)
+_CONTENT_FILES = frozenset({"pyproject.toml", "Dockerfile", ".htaccess"})
+
+def _reads_content(relpath: str) -> bool:
+    name = os.path.basename(relpath)
+    return name in _CONTENT_FILES or name.endswith(_CONTENT_SUFFIXES)
+
+def _git_tree(top: str) -> Optional[Tuple[List[tuple], Dict[str, str]]]:
+    """
+    (root, dirs, files) triples for the files tracked in `top`'s git index,
+    plus the blob id of each file whose working copy matches the index. The
+    index replaces the directory traversal, leaves out untracked build output
+    and identifies file contents without reading them. Returns None when
+    `top` is not a git checkout.
+    """
+    if not os.path.isdir(os.path.join(top, ".git")):
+        return None
+    try:
+        staged, modified = (
+            subprocess.run(
+                ["git", "-C", top, "ls-files", "-z", flag],
+                check=True,
+                capture_output=True,
+                timeout=60
+            ).stdout
+            for flag in ("--stage", "--modified")
+        )
+    except (subprocess.SubprocessError, OSError):
+        return None
+
+    tree: Dict[str, tuple] = {"": ([], [])}
+    blobs: Dict[str, str] = {}
+    for raw in staged.split(b"\0"):
+        if not raw:
+            continue
+        # "<mode> <blob id> <stage>\t<path>"
+        meta, _, raw_path = raw.partition(b"\t")
+        relpath = os.fsdecode(raw_path)
+        parts = relpath.split("/")
+        if SKIP_DIRS.intersection(parts[:-1]) or relpath in blobs:
+            continue
+        _, blob, stage = meta.split()
+        # Unmerged paths are listed once per stage and have no single blob
+        blobs[relpath] = blob.decode() if stage == b"0" else None
+        parent = ""
+        for part in parts[:-1]:
+            child = f"{parent}/{part}" if parent else part
+            if child not in tree:
+                tree[child] = ([], [])
+                tree[parent][0].append(part)
+            parent = child
+        tree[parent][1].append(parts[-1])
+    # Edited since staging: the blob id no longer describes the file
+    for raw_path in modified.split(b"\0"):
+        blobs[os.fsdecode(raw_path)] = None
+    blobs = {relpath: blob for relpath, blob in blobs.items() if blob is not None}
+    return [(os.path.join(top, rel) if rel else top, dirs, files) for rel, (dirs, files) in tree.items()], blobs
+
+_SCAN_POOL: Optional[ProcessPoolExecutor] = None
+_SCAN_POOL_LOCK = threading.Lock()
+
+def _scan_pool() -> ProcessPoolExecutor:
+    """
+    Process pool for the per-file scans, started on first use and reused by
+    every layer and analysis in this process. Workers are forked where the
+    platform allows it, so they inherit the imported modules and compiled
+    patterns instead of re-importing the analyzer (and the LLM client stack
+    behind it) on start-up.
+    """
+    global _SCAN_POOL
+    with _SCAN_POOL_LOCK:
+        if _SCAN_POOL is None:
+            ctx = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+            _SCAN_POOL = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=ctx)
+        return _SCAN_POOL
+
+def _process_map(fn: Callable, *iterables) -> List[Any]:
+    """
+    map() for the CPU-bound per-file scans, spread over a process pool to get
+    past the GIL. Small batches, and daemonic processes (which may not have
+    children), run serially; so does any batch the pool fails to run.
+    """
+    global _SCAN_POOL
+    items = [list(it) for it in iterables]
+    if len(items[0]) >= _PARALLEL_MIN_FILES and not multiprocessing.current_process().daemon:
+        try:
+            return list(_scan_pool().map(fn, *items, chunksize=64))
+        except (OSError, RuntimeError) as e:
+            logger.warning("Process pool unavailable, scanning serially: %s", e)
+            with _SCAN_POOL_LOCK:
+                # A broken pool can't be reused; the next batch starts a fresh one
+                if _SCAN_POOL is not None:
+                    _SCAN_POOL.shutdown(wait=False, cancel_futures=True)
+                    _SCAN_POOL = None
+    return list(map(fn, *items))
+
+# Each pattern is paired with literals one of which any match must contain;
+# a substring check rules most files out before the regex engine runs.
+
+# Secret Patterns
+_SECRET_PATTERNS = {
+    "AWS Access Key": (("AKIA",), re.compile(r"AKIA[0-9A-Z]{16}")),
+    "GitHub Token": (("ghp_",), re.compile(r"ghp_[a-zA-Z0-9]{36}")),
+    "Private Key": (("PRIVATE KEY-----",), re.compile(r"-----BEGIN [A-Z ]+ PRIVATE KEY-----")),
+    "Stripe API Key": (("sk_live_",), re.compile(r"sk_live_[0-9a-zA-Z]{24}")),
+    "Database URL": (("://",), re.compile(r"postgresql://[a-zA-Z0-9:]+@[a-zA-Z0-9.-]+:[0-9]+/|[a-z]+://[a-z0-9_]+:[a-z0-9_]+@"))
+}
+
+# SAST Patterns (Code Injection & SQLi)
+_SAST_PATTERNS = {
+    "Insecure eval()": (("eval(",), re.compile(r"eval\(.*\)")),
+    "Insecure exec()": (("exec(",), re.compile(r"exec\(.*\)")),
+    "Shell Injection": (("shell=True",), re.compile(r"shell=True")),
+    "Potential SQL Injection": (("SELECT ", ".execute(", ".run("), re.compile(r"(SELECT .* FROM .* WHERE .* (%|\.format|f[\"']))|(\.execute|\.run)\(.*(%|\.format|f[\"']).*\)"))
+}
+
+# Vulnerable Dependency Signatures
+_VULN_SIGS = {
+    "requests": (("requests",), re.compile(r"requests[<>=! ]*2\.(2[0-7]|1[0-9]|0\.[0-9])")), # Old requests
+    "flask": (("flask",), re.compile(r"flask[<>=! ]*(0\.|1\.0)")), # Very old flask
+    "express": (('"express"',), re.compile(r"\"express\":\s*\"[\^~]?[0-3]\.")), # Express < 4
+    "lodash": (('"lodash"',), re.compile(r"\"lodash\":\s*\"[\^~]?[0-3]\."))  # Lodash < 4
+}
+
+def _scan_security(name: str, content: str) -> List[List[str]]:
+    """Security findings for one file as [type, severity, label, description] rows."""
+    findings = []
+
+    # 1. Scan for Secrets
+    for label, (literals, pattern) in _SECRET_PATTERNS.items():
+        if any(lit in content for lit in literals) and pattern.search(content):
+            findings.append(["Secret Leak", "CRITICAL", label, f"Potential {label} detected in plain text."])
+
+    # 2. Scan for SAST (only in source files)
+    if name.endswith((".py", ".js", ".ts", ".php", ".rb")):
+        for label, (literals, pattern) in _SAST_PATTERNS.items():
+            if any(lit in content for lit in literals) and pattern.search(content):
+                findings.append(["Vulnerability (SAST)", "HIGH", label, f"Dangerous usage of {label} detected. Susceptible to injection attacks."])
+
+    # 3. Scan for Vulnerable Dependencies
+    if name in ["requirements.txt", "package.json"]:
+        for pkg, (literals, sig) in _VULN_SIGS.items():
+            if any(lit in content for lit in literals) and sig.search(content):
+                findings.append(["Vulnerable Dependency", "HIGH", f"Insecure {pkg} version", f"The version of {pkg} detected has known security flaws (CVEs)."])
+
+    return findings
+
+def _scan_complexity(name: str, code: str) -> List[Any]:
+    """
+    Cyclomatic complexity of one Python file as
+    [function_count, complexity_sum, [[function, complexity], ...] over 10].
+    """
+    try:
+        tree = ast.parse(code)
+    except Exception:
+        return [0, 0, []]
+
+    function_count = 0
+    complexity_sum = 0
+    hot_functions = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            # Base complexity is 1
+            complexity = 1
+            for child in ast.walk(node):
+                if isinstance(child, (ast.If, ast.For, ast.While, ast.ExceptHandler, ast.With, ast.And, ast.Or, ast.Assert)):
+                    complexity += 1
+
+            function_count += 1
+            complexity_sum += complexity
+            if complexity > 10: # Threshold for high complexity
+                hot_functions.append([node.name, complexity])
+    return [function_count, complexity_sum, hot_functions]
+
+@lru_cache(maxsize=256)
+def _score(has_docker: bool, has_ci_cd: bool, has_readme: bool, has_gitignore: bool,
+           has_tests: bool, pattern_count: int, modularity: float, critical: int, high: int,
+           avg_complexity: float, dup_ratio: float) -> Tuple[int, str, Tuple[Tuple[str, int], ...]]:
+    """
+    (score, maturity label, breakdown items) from the handful of findings the
+    grade depends on. Pure and keyed on those inputs, so repeat gradings of the
+    same finding set are a cache hit.
+    """
+    score = 0
+    # 1. Infrastructure (30 pts)
+    infra_score = 0
+    if has_docker: infra_score += 15
+    if has_ci_cd: infra_score += 15
+    score += infra_score
+
+    # 2. Standards & Tests (30 pts)
+    standards_score = 0
+    if has_readme: standards_score += 5
+    if has_gitignore: standards_score += 5
+    if has_tests: standards_score += 20
+    score += standards_score
+
+    # 3. Architecture & Modularity (40 pts)
+    arch_score = 0
+    arch_score += min(30, pattern_count * 10)
+    arch_score += (modularity / 100) * 10
+    score += arch_score
+
+    overall = min(100, int(score))
+
+    # 4. Security Penalties
+    security_penalty = critical * 30 + high * 15
+    overall = max(0, overall - security_penalty)
+
+    # 5. Complexity Penalties
+    complexity_penalty = 0
+    if avg_complexity > 15: complexity_penalty += 15
+    elif avg_complexity > 8: complexity_penalty += 5
+    overall = max(0, overall - complexity_penalty)
+
+    # 6. Duplication Penalties
+    dup_penalty = 0
+    if dup_ratio > 15: dup_penalty += 15
+    elif dup_ratio > 5: dup_penalty += 5
+    overall = max(0, overall - dup_penalty)
+
+    # Assign Maturity Label
+    if overall <= 40:
+        label = "Basic"
+    elif overall <= 65:
+        label = "Intermediate"
+    elif overall <= 85:
+        label = "Production"
+    else:
+        label = "Enterprise"
+
+    # Items rather than a dict: the cached value is shared between callers
+    breakdown = (
+        ("infrastructure", infra_score),
+        ("standards_tests", standards_score),
+        ("architecture", int(arch_score)),
+        ("security", -security_penalty),
+        ("complexity", -complexity_penalty),
+        ("duplication", -dup_penalty),
+    )
+    return overall, label, breakdown
+
 class RepositoryAnalyzer:
-    def __init__(self, repo_path: str, on_progress: Optional[Callable[[str], None]] = None):
+    def __init__(self, repo_path: str, on_progress: Optional[Callable[[str], None]] = None,
+                 on_finding: Optional[Callable[[Dict[str, Any]], None]] = None):
         self.repo_path = repo_path
         self.on_progress = on_progress
+        self.on_finding = on_finding
         self.repo_id = repo_path.split("/")[-1]
         self.static_findings: Dict[str, Any] = {}
         self.structural_findings: Dict[str, Any] = {}
@@ -22,7 +318,7 @@ class RepositoryAnalyzer:
         self.score_breakdown: Dict[str, int] = {}
         self.roadmap: List[Dict[str, str]] = []
         self.security_findings: List[Dict[str, Any]] = []
-        self.logs: List[str] = []
+        self.logs: Deque[str] = deque(maxlen=_MAX_LOGS)
         self.brain = ArchonBrain()
         self.ai_analysis: Dict[str, Any] = {}
         self.structured_critique: Dict[str, Any] = {
@@ -34,6 +330,64 @@ class RepositoryAnalyzer:
         self.duplication_results: Dict[str, Any] = {}
         self.secops_results: Dict[str, Any] = {}
         self.tech_recommendations: Dict[str, Any] = {}
+        self._tree: Optional[List[tuple]] = None
+        self._blobs: Dict[str, str] = {}
+
+    def _walk(self) -> List[tuple]:
+        """Repository file index, enumerated once and shared by every layer."""
+        if self._tree is None:
+            indexed = _git_tree(self.repo_path)
+            if indexed is not None:
+                self._tree, self._blobs = indexed
+            else:
+                # Sorted so reports don't depend on which listing finished first
+                self._tree = sorted(parallel_walk(self.repo_path, SKIP_DIRS), key=lambda t: t[0])
+        return self._tree
+
+    def _scan_files(self, fn: Callable[[str, str], Any], selector: Callable[[str], bool], limit: int = -1) -> Iterator[Tuple[str, Any]]:
+        """
+        Yield (file_path, fn(name, content)) for every file `selector` accepts,
+        reading at most `limit` characters. Results are memoized by content and
+        the misses are computed in parallel, _SCAN_CHUNK files at a time so only
+        one chunk's contents is held in memory.
+        """
+        paths, names, contents = [], [], []
+        for root, _, files in self._walk():
+            for file in files:
+                if not selector(file):
+                    continue
+                file_path = os.path.join(root, file)
+                try:
+                    with open(file_path, 'r', errors='ignore') as f:
+                        contents.append(f.read(limit))
+                except Exception:
+                    continue
+                paths.append(file_path)
+                names.append(file)
+                if len(paths) >= _SCAN_CHUNK:
+                    yield from zip(paths, cache.file_cache.memo_many(fn.__name__, names, contents, fn, _process_map))
+                    paths, names, contents = [], [], []
+        if paths:
+            yield from zip(paths, cache.file_cache.memo_many(fn.__name__, names, contents, fn, _process_map))
+
+    def _content_key(self, opts: Dict[str, Any]) -> str:
+        """Report cache key: indexed blob ids where known, else hashes of the files layers read."""
+        relpaths = self._relpaths()
+        return cache.content_key(self.repo_path, relpaths, opts, known=self._blobs, reads=_reads_content)
+
+    def _relpaths(self) -> List[str]:
+        """Repository-relative paths of every indexed file."""
+        return [
+            os.path.relpath(os.path.join(root, file), self.repo_path)
+            for root, _, files in self._walk()
+            for file in files
+        ]
+
+    def _add_finding(self, finding: Dict[str, Any]):
+        """Record a security finding and hand it to on_finding as it is found."""
+        self.security_findings.append(finding)
+        if self.on_finding is not None:
+            self.on_finding(finding)
 
     def _log(self, message: str):
         self.logs.append(message)
@@ -41,37 +395,55 @@ class RepositoryAnalyzer:
             self.on_progress(message)
 
     async def analyze(self) -> Dict[str, Any]:
-        """Run all analysis layers."""
+        """
+        Run all analysis layers. The file-bound layers run on a worker thread
+        so the event loop stays free while they read the tree; on_progress and
+        on_finding may therefore be called from that thread.
+        """
+        # An unchanged tree with the same options reuses the stored report, even
+        # when it was first audited under another id (e.g. a fresh clone)
+        opts = {"ai_enabled": self.brain.client is not None}
+        cache_key = await asyncio.to_thread(self._content_key, opts)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            self._log("Cache: Repository content unchanged since a previous audit. Reusing report.")
+            cached["id"] = self.repo_id
+            cached["logs"] = list(self.logs)
+            if self.on_finding is not None:
+                for finding in cached.get("security_findings", []):
+                    self.on_finding(finding)
+            return cached
+
         self._log("Phase Alpha: Initiating deep static scan...")
-        self._run_layer1_static_scan()
+        await asyncio.to_thread(self._run_layer1_static_scan)
         
         self._log("Phase Beta: Evaluating structural modularity and patterns...")
-        self._run_layer2_structural_evaluation()
+        await asyncio.to_thread(self._run_layer2_structural_evaluation)
         
         self._log("Phase Gamma: Running heuristic architectural audit...")
         self._run_layer3_architectural_critique()
         
         self._log("Phase Delta: Auditing security layers and secrets...")
-        self._run_layer5_security_scan()
+        await asyncio.to_thread(self._run_layer5_security_scan)
         
         self._log("Phase Eta: Deep Infrastructure Audit (Config Hardening)...")
-        self._run_layer8_infra_deep_audit()
+        await asyncio.to_thread(self._run_layer8_infra_deep_audit)
         
         # The deterministic roadmap generation is removed as AI will handle it.
         # self._log("Phase Theta: Generating actionable transformation roadmap...")
         # self._run_layer4_actionable_roadmap()
 
         self._log("Phase Iota: Calculating deterministic code complexity (AST)...")
-        self._run_layer9_complexity_analysis()
+        await asyncio.to_thread(self._run_layer9_complexity_analysis)
         
         self._log("Phase Kappa: Running DRY Audit (Code Duplication Scan)...")
-        self._run_layer10_duplication_scan()
+        await asyncio.to_thread(self._run_layer10_duplication_scan)
 
         self._log("Phase Lambda: Conducting SecOps Enterprise Audit (SSL/DNS)...")
-        self._run_layer11_secops_audit()
+        await asyncio.to_thread(self._run_layer11_secops_audit)
         
         self._log("Phase Mu: Mapping architectural dependency graph...")
-        self._run_layer7_dependency_graph()
+        await asyncio.to_thread(self._run_layer7_dependency_graph)
 
         self._calculate_final_score() # Calculate BEFORE AI analysis so we can pass it to the brain
         
@@ -83,7 +455,7 @@ class RepositoryAnalyzer:
         
         self._log("Analysis Complete.")
         
-        return {
+        results = {
             "id": self.repo_path.split("/")[-1],
             "static_scan": self.static_findings,
             "structural_evaluation": self.structural_findings,
@@ -100,8 +472,13 @@ class RepositoryAnalyzer:
             "secops": self.secops_results,
             "tech_recommendations": self.tech_recommendations,
             "dependency_graph": getattr(self, "dependency_graph", {"nodes": [], "links": []}),
-            "logs": self.logs
+            "logs": list(self.logs)
         }
+        cache.file_cache.save()
+        # Failed AI audits are retried next run rather than cached
+        if "error" not in self.ai_analysis:
+            cache.put(cache_key, results)
+        return results
 
     def _run_layer1_static_scan(self):
         """Layer 1: Detect tech stack and standards with categorization."""
@@ -129,9 +506,7 @@ class RepositoryAnalyzer:
         test_frameworks: Set[str] = set()
         testing_detected = False
 
-        for root, dirs, files in os.walk(self.repo_path):
-            if any(x in root for x in [".git", "node_modules", "__pycache__", "venv", ".venv"]):
-                continue
+        for root, dirs, files in self._walk():
             
             # Detect Standards
             if "README.md" in files: standards["has_readme"] = True
@@ -180,12 +555,9 @@ class RepositoryAnalyzer:
                     except: pass
 
                 # Extension-based detection
-                if file.endswith((".py")): stack_categories["Languages"].add("Python")
-                if file.endswith((".js", ".jsx", ".ts", ".tsx")): stack_categories["Languages"].add("JavaScript/TypeScript")
-                if file.endswith(".go"): stack_categories["Languages"].add("Go")
-                if file.endswith(".rs"): stack_categories["Languages"].add("Rust")
-                if file.endswith(".java"): stack_categories["Languages"].add("Java")
-                if file.endswith(".tf"): 
+                ext = os.path.splitext(file)[1]
+                if ext in _EXT_LANGUAGES: stack_categories["Languages"].add(_EXT_LANGUAGES[ext])
+                if ext == ".tf": 
                     standards["has_terraform"] = True
                     stack_categories["Infrastructure"].add("Terraform")
                 
@@ -246,8 +618,9 @@ class RepositoryAnalyzer:
         concerns_separation = "Unknown"
 
         try:
-            root_dirs = [d for d in os.listdir(self.repo_path) 
-                        if os.path.isdir(os.path.join(self.repo_path, d)) and not d.startswith(".")]
+            # DirEntry.is_dir() answers from the directory read, no stat per entry
+            with os.scandir(self.repo_path) as it:
+                root_dirs = [e.name for e in it if not e.name.startswith(".") and e.is_dir()]
         except Exception:
             root_dirs = []
         
@@ -336,75 +709,19 @@ class RepositoryAnalyzer:
     def _calculate_final_score(self):
         """Calculate a weighted maturity score (0-100) and assign a grade."""
         static = self.static_findings
-        struct = self.structural_findings
         stds = static.get("standards", {})
-        
-        score = 0
-        # 1. Infrastructure (30 pts)
-        infra_score = 0
-        if stds.get("has_docker"): infra_score += 15
-        if stds.get("has_ci_cd"): infra_score += 15
-        score += infra_score
-        
-        # 2. Standards & Tests (30 pts)
-        standards_score = 0
-        if stds.get("has_readme"): standards_score += 5
-        if stds.get("has_gitignore"): standards_score += 5
-        if static.get("testing", {}).get("detected"): standards_score += 20
-        score += standards_score
-        
-        # 3. Architecture & Modularity (40 pts)
-        arch_score = 0
-        patterns = struct.get("patterns_detected", [])
-        arch_score += min(30, len(patterns) * 10)
-        mod_val = struct.get("modularity_score", 0)
-        arch_score += (mod_val / 100) * 10
-        score += arch_score
-
-        self.overall_score = min(100, int(score))
-
-        # 4. Security Penalties
-        security_penalty = 0
-        for find in self.security_findings:
-            if find["severity"] == "CRITICAL": security_penalty += 30
-            if find["severity"] == "HIGH": security_penalty += 15
-        
-        self.overall_score = max(0, self.overall_score - security_penalty)
-        
-        # 5. Complexity Penalties
-        complexity_penalty = 0
-        avg_comp = self.complexity_results.get("average_complexity", 0)
-        if avg_comp > 15: complexity_penalty += 15
-        elif avg_comp > 8: complexity_penalty += 5
-        
-        self.overall_score = max(0, self.overall_score - complexity_penalty)
-
-        # 6. Duplication Penalties
-        dup_penalty = 0
-        dup_ratio = self.duplication_results.get("duplication_ratio", 0)
-        if dup_ratio > 15: dup_penalty += 15
-        elif dup_ratio > 5: dup_penalty += 5
-        
-        self.overall_score = max(0, self.overall_score - dup_penalty)
-
-        # Assign Maturity Label
-        if self.overall_score <= 40:
-            self.maturity_label = "Basic"
-        elif self.overall_score <= 65:
-            self.maturity_label = "Intermediate"
-        elif self.overall_score <= 85:
-            self.maturity_label = "Production"
-        else:
-            self.maturity_label = "Enterprise"
-
-        self.score_breakdown = {
-             "infrastructure": infra_score,
-             "standards_tests": standards_score,
-             "architecture": int(arch_score),
-             "security": -security_penalty,
-             "complexity": -complexity_penalty,
-             "duplication": -dup_penalty
-        }
+        severities = [find["severity"] for find in self.security_findings]
+        self.overall_score, self.maturity_label, breakdown = _score(
+            bool(stds.get("has_docker")), bool(stds.get("has_ci_cd")),
+            bool(stds.get("has_readme")), bool(stds.get("has_gitignore")),
+            bool(static.get("testing", {}).get("detected")),
+            len(self.structural_findings.get("patterns_detected", [])),
+            self.structural_findings.get("modularity_score", 0),
+            severities.count("CRITICAL"), severities.count("HIGH"),
+            self.complexity_results.get("average_complexity", 0),
+            self.duplication_results.get("duplication_ratio", 0)
+        )
+        self.score_breakdown = dict(breakdown)
 
     # The deterministic _run_layer4_actionable_roadmap is removed as AI will handle it.
     # def _run_layer4_actionable_roadmap(self):
@@ -484,82 +801,20 @@ class RepositoryAnalyzer:
 
     def _run_layer5_security_scan(self):
         """Layer 5: Detect secrets, vulnerable deps, and code injection."""
-        import re
-        
-        # Secret Patterns
-        secret_patterns = {
-            "AWS Access Key": r"AKIA[0-9A-Z]{16}",
-            "GitHub Token": r"ghp_[a-zA-Z0-9]{36}",
-            "Private Key": r"-----BEGIN [A-Z ]+ PRIVATE KEY-----",
-            "Stripe API Key": r"sk_live_[0-9a-zA-Z]{24}",
-            "Database URL": r"postgresql://[a-zA-Z0-9:]+@[a-zA-Z0-9.-]+:[0-9]+/|[a-z]+://[a-z0-9_]+:[a-z0-9_]+@"
-        }
-
-        # SAST Patterns (Code Injection & SQLi)
-        sast_patterns = {
-            "Insecure eval()": r"eval\(.*\)",
-            "Insecure exec()": r"exec\(.*\)",
-            "Shell Injection": r"shell=True",
-            "Potential SQL Injection": r"(SELECT .* FROM .* WHERE .* (%|\.format|f[\"']))|(\.execute|\.run)\(.*(%|\.format|f[\"']).*\)"
-        }
-
-        # Vulnerable Dependency Signatures
-        vuln_sigs = {
-            "requests": r"requests[<>=! ]*2\.(2[0-7]|1[0-9]|0\.[0-9])", # Old requests
-            "flask": r"flask[<>=! ]*(0\.|1\.0)", # Very old flask
-            "express": r"\"express\":\s*\"[\^~]?[0-3]\.", # Express < 4
-            "lodash": r"\"lodash\":\s*\"[\^~]?[0-3]\."  # Lodash < 4
-        }
-
-        for root, dirs, files in os.walk(self.repo_path):
-            if any(x in root for x in [".git", "node_modules", "__pycache__"]):
-                continue
-            
-            for file in files:
-                file_path = os.path.join(root, file)
-                if not file.endswith((".py", ".js", ".ts", ".php", ".rb", ".go", ".tf", ".env", ".yml", ".json", ".txt")):
-                    continue
-
-                try:
-                    with open(file_path, 'r', errors='ignore') as f:
-                        content = f.read(5000)
-                        
-                        # 1. Scan for Secrets
-                        for label, pattern in secret_patterns.items():
-                            if re.search(pattern, content):
-                                self.security_findings.append({
-                                    "type": "Secret Leak",
-                                    "severity": "CRITICAL",
-                                    "label": label,
-                                    "file": os.path.relpath(file_path, self.repo_path),
-                                    "description": f"Potential {label} detected in plain text."
-                                })
-
-                        # 2. Scan for SAST (only in source files)
-                        if file.endswith((".py", ".js", ".ts", ".php", ".rb")):
-                            for label, pattern in sast_patterns.items():
-                                if re.search(pattern, content):
-                                    self.security_findings.append({
-                                        "type": "Vulnerability (SAST)",
-                                        "severity": "HIGH",
-                                        "label": label,
-                                        "file": os.path.relpath(file_path, self.repo_path),
-                                        "description": f"Dangerous usage of {label} detected. Susceptible to injection attacks."
-                                    })
-                        
-                        # 3. Scan for Vulnerable Dependencies
-                        if file in ["requirements.txt", "package.json"]:
-                            for pkg, sig in vuln_sigs.items():
-                                if re.search(sig, content):
-                                    self.security_findings.append({
-                                        "type": "Vulnerable Dependency",
-                                        "severity": "HIGH",
-                                        "label": f"Insecure {pkg} version",
-                                        "file": os.path.relpath(file_path, self.repo_path),
-                                        "description": f"The version of {pkg} detected has known security flaws (CVEs)."
-                                    })
-                except Exception:
-                    pass
+        scanned = self._scan_files(
+            _scan_security,
+            lambda file: file.endswith((".py", ".js", ".ts", ".php", ".rb", ".go", ".tf", ".env", ".yml", ".json", ".txt")),
+            limit=5000
+        )
+        for file_path, rows in scanned:
+            for finding_type, severity, label, description in rows:
+                self._add_finding({
+                    "type": finding_type,
+                    "severity": severity,
+                    "label": label,
+                    "file": os.path.relpath(file_path, self.repo_path),
+                    "description": description
+                })
 
     def _run_layer4b_tech_recommendations(self):
         """Layer 4B: Generate intelligent tech stack recommendations."""
@@ -594,43 +849,10 @@ class RepositoryAnalyzer:
         }
 
         # 1. Collect representative file samples for the LLM
-        samples = []
-        total_chars = 0
-        max_chars = 28000  # Safety limit for Groq payload (approx 7-8k tokens)
-        
-        # Priority mapping for files that define architecture
-        priority_keywords = ["main", "app", "index", "settings", "config", "models", "schema", "routes", "controller"]
-        priority_files = ["Dockerfile", "docker-compose.yml", "package.json", "requirements.txt", "pyproject.toml", "next.config.js"]
-
-        all_candidate_files = []
-        for root, _, files in os.walk(self.repo_path):
-            if any(x in root for x in [".git", "node_modules", "__pycache__", "venv", ".venv"]): continue
-            for file in files:
-                file_path = os.path.join(root, file)
-                if any(file_path.endswith(ext) for ext in [".py", ".js", ".ts", ".tsx", ".go", ".tf", ".conf", ".yaml", ".yml"]) or file in priority_files:
-                    rel_path = os.path.relpath(file_path, self.repo_path)
-                    
-                    # Calculate priority score
-                    score = 0
-                    if file in priority_files: score += 100
-                    if any(kw in file.lower() for kw in priority_keywords): score += 50
-                    if rel_path.count("/") == 0: score += 20 # Root files usually important
-                    
-                    all_candidate_files.append({"path": rel_path, "abs": file_path, "score": score})
-
-        # Sort by priority score descending
-        all_candidate_files.sort(key=lambda x: x["score"], reverse=True)
-
-        for item in all_candidate_files:
-            if len(samples) >= 15: break 
-            if total_chars >= max_chars: break
-            
-            try:
-                with open(item["abs"], 'r', errors='ignore') as f:
-                    content = f.read(2000) # Reduced per-file limit to allow more files
-                    samples.append({"path": item["path"], "content": content})
-                    total_chars += len(content)
-            except: pass
+        max_chars = _CONTEXT_TOKEN_BUDGET * _CHARS_PER_TOKEN  # Safety limit for Groq payload
+        metrics_text = f"Project Metrics: {project_context}\n\nFile Samples:\n"
+        token_budget = _CONTEXT_TOKEN_BUDGET - _estimate_tokens(metrics_text)
+        samples = await asyncio.to_thread(self._collect_samples, token_budget)
 
         # 2. Call Brain with scores for justification
         scores_for_ai = {
@@ -639,7 +861,7 @@ class RepositoryAnalyzer:
         }
         
         # Build context summary from samples and other data
-        context_text = f"Project Metrics: {project_context}\n\nFile Samples:\n"
+        context_text = metrics_text
         for s in samples:
             context_text += f"\nFILE: {s['path']}\n{s['content']}\n"
 
@@ -676,6 +898,51 @@ class RepositoryAnalyzer:
         else:
             self._log(f"AI Warning: {self.ai_analysis['error']}")
 
+    def _collect_samples(self, token_budget: int) -> List[Dict[str, str]]:
+        """Pick and read the architecture-defining files that fit in `token_budget`."""
+        samples = []
+
+        # Priority mapping for files that define architecture
+        priority_keywords = ["main", "app", "index", "settings", "config", "models", "schema", "routes", "controller"]
+        priority_files = ["Dockerfile", "docker-compose.yml", "package.json", "requirements.txt", "pyproject.toml", "next.config.js"]
+
+        all_candidate_files = []
+        for root, _, files in self._walk():
+            for file in files:
+                file_path = os.path.join(root, file)
+                if any(file_path.endswith(ext) for ext in [".py", ".js", ".ts", ".tsx", ".go", ".tf", ".conf", ".yaml", ".yml"]) or file in priority_files:
+                    rel_path = os.path.relpath(file_path, self.repo_path)
+                    
+                    # Calculate priority score
+                    score = 0
+                    if file in priority_files: score += 100
+                    if any(kw in file.lower() for kw in priority_keywords): score += 50
+                    if rel_path.count("/") == 0: score += 20 # Root files usually important
+                    
+                    all_candidate_files.append({"path": rel_path, "abs": file_path, "score": score})
+
+        # Sort by priority score descending
+        all_candidate_files.sort(key=lambda x: x["score"], reverse=True)
+
+        for idx, item in enumerate(all_candidate_files):
+            if len(samples) >= _MAX_SAMPLES: break
+            if token_budget <= 0: break
+            
+            # Split what is left of the budget evenly over the remaining slots, so
+            # short files hand their unused allowance to the ones that follow
+            slots_left = min(_MAX_SAMPLES - len(samples), len(all_candidate_files) - idx)
+            share = token_budget // slots_left
+            if share <= 0: break # Too little left to include anything but empty samples
+            try:
+                # Read only the bytes we keep; decoding happens on the slice alone
+                with open(item["abs"], 'rb') as f:
+                    content = f.read(share * _CHARS_PER_TOKEN).decode('utf-8', errors='ignore')
+                    samples.append({"path": item["path"], "content": content})
+                    token_budget -= _estimate_tokens(item["path"]) + _estimate_tokens(content)
+            except: pass
+
+        return samples
+
     def _run_layer7_dependency_graph(self):
         """Layer 7: Build a node-link graph of module dependencies."""
         nodes = []
@@ -683,9 +950,7 @@ class RepositoryAnalyzer:
         file_to_id = {}
         
         # 1. Identify all source files as nodes
-        for root, _, files in os.walk(self.repo_path):
-            if any(x in root for x in [".git", "node_modules", "__pycache__", "venv"]):
-                continue
+        for root, _, files in self._walk():
             for file in files:
                 if file.endswith((".py", ".js", ".ts", ".tsx", ".go")):
                     rel_path = os.path.relpath(os.path.join(root, file), self.repo_path)
@@ -740,9 +1005,7 @@ class RepositoryAnalyzer:
 
     def _run_layer8_infra_deep_audit(self):
         """Layer 8: Audit configuration files for security and performance."""
-        for root, _, files in os.walk(self.repo_path):
-            if any(x in root for x in [".git", "node_modules"]):
-                continue
+        for root, _, files in self._walk():
             
             for file in files:
                 file_path = os.path.join(root, file)
@@ -755,13 +1018,13 @@ class RepositoryAnalyzer:
                             
                             # Security Headers
                             if "add_header Strict-Transport-Security" not in content:
-                                self.security_findings.append({
+                                self._add_finding({
                                     "type": "Infrastructure Gap", "severity": "MEDIUM", "label": "Missing HSTS",
                                     "file": os.path.relpath(file_path, self.repo_path),
                                     "description": "Nginx config missing HSTS header. Connections can be downgraded to HTTP."
                                 })
                             if "add_header Content-Security-Policy" not in content:
-                                self.security_findings.append({
+                                self._add_finding({
                                     "type": "Infrastructure Gap", "severity": "MEDIUM", "label": "Missing CSP",
                                     "file": os.path.relpath(file_path, self.repo_path),
                                     "description": "Missing Content-Security-Policy. Vulnerable to XSS/Injection."
@@ -769,7 +1032,7 @@ class RepositoryAnalyzer:
                             
                             # SSL Audit
                             if re.search(r"ssl_protocols.*TLSv1(\.1)?", content):
-                                self.security_findings.append({
+                                self._add_finding({
                                     "type": "Security Risk", "severity": "HIGH", "label": "Legacy TLS Protocol",
                                     "file": os.path.relpath(file_path, self.repo_path),
                                     "description": "Config allows TLS 1.0/1.1. These are deprecated and insecure."
@@ -791,7 +1054,7 @@ class RepositoryAnalyzer:
                         with open(file_path, 'r', errors='ignore') as f:
                             content = f.read()
                             if "Header set Strict-Transport-Security" not in content:
-                                self.security_findings.append({
+                                self._add_finding({
                                     "type": "Infrastructure Gap", "severity": "MEDIUM", "label": "Missing HSTS (Apache)",
                                     "file": os.path.relpath(file_path, self.repo_path),
                                     "description": "Apache config missing HSTS. Use 'Header set Strict-Transport-Security' to fix."
@@ -804,37 +1067,16 @@ class RepositoryAnalyzer:
         total_complexity = 0
         function_count = 0
         
-        for root, _, files in os.walk(self.repo_path):
-            if any(x in root for x in [".git", "node_modules", "__pycache__", "venv"]):
-                continue
-            for file in files:
-                if file.endswith(".py"):
-                    file_path = os.path.join(root, file)
-                    try:
-                        with open(file_path, "r", errors="ignore") as f:
-                            code = f.read()
-                            tree = ast.parse(code)
-                            
-                            for node in ast.walk(tree):
-                                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
-                                    # Calculate complexity for this function
-                                    # Base complexity is 1
-                                    complexity = 1
-                                    for child in ast.walk(node):
-                                        if isinstance(child, (ast.If, ast.For, ast.While, ast.ExceptHandler, ast.With, ast.And, ast.Or, ast.Assert)):
-                                            complexity += 1
-                                    
-                                    function_count += 1
-                                    total_complexity += complexity
-                                    
-                                    if complexity > 10: # Threshold for high complexity
-                                        complexity_reports.append({
-                                            "file": os.path.relpath(file_path, self.repo_path),
-                                            "function": node.name,
-                                            "complexity": complexity,
-                                            "severity": "HIGH" if complexity > 20 else "MEDIUM"
-                                        })
-                    except: pass
+        for file_path, (count, complexity_sum, hot_functions) in self._scan_files(_scan_complexity, lambda file: file.endswith(".py")):
+            function_count += count
+            total_complexity += complexity_sum
+            for name, complexity in hot_functions:
+                complexity_reports.append({
+                    "file": os.path.relpath(file_path, self.repo_path),
+                    "function": name,
+                    "complexity": complexity,
+                    "severity": "HIGH" if complexity > 20 else "MEDIUM"
+                })
         
         self.complexity_results = {
             "critical_functions": complexity_reports[:10], # Cap for UI
@@ -852,16 +1094,14 @@ class RepositoryAnalyzer:
 
     def _run_layer10_duplication_scan(self):
         """Layer 10: Identify copy-pasted code blocks using structural hashing."""
-        hashes = {} # hash -> list of (file, start_line)
+        hashes = defaultdict(list) # hash -> list of (file, start_line)
         duplications = []
         total_lines = 0
         duplicated_lines_count = 0
         
         chunk_size = 6 # Minimum lines to consider a duplicate
         
-        for root, _, files in os.walk(self.repo_path):
-            if any(x in root for x in [".git", "node_modules", "__pycache__", "venv"]):
-                continue
+        for root, _, files in self._walk():
             for file in files:
                 if file.endswith((".py", ".js", ".ts", ".go", ".java")):
                     file_path = os.path.join(root, file)
@@ -875,11 +1115,7 @@ class RepositoryAnalyzer:
                                 chunk = "".join(lines[i:i + chunk_size])
                                 h = hashlib.md5(chunk.encode()).hexdigest()
                                 
-                                loc = (os.path.relpath(file_path, self.repo_path), i + 1)
-                                if h in hashes:
-                                    hashes[h].append(loc)
-                                else:
-                                    hashes[h] = [loc]
+                                hashes[h].append((os.path.relpath(file_path, self.repo_path), i + 1))
                     except: pass
         
         # Identify duplicates
@@ -923,8 +1159,7 @@ class RepositoryAnalyzer:
         domain_pattern = r"(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,6}"
         exempt_domains = ["github.com", "pypi.org", "npmjs.com", "localhost", "127.0.0.1", "google.com", "microsoft.com", "apple.com"]
         
-        for root, _, files in os.walk(self.repo_path):
-            if any(x in root for x in [".git", "node_modules"]): continue
+        for root, _, files in self._walk():
             for file in files:
                 if file.endswith((".py", ".env", ".conf", ".yml", ".json")):
                     file_path = os.path.join(root, file)
@@ -952,7 +1187,7 @@ class RepositoryAnalyzer:
                                 days_left = (expires - datetime.datetime.utcnow()).days
                                 
                                 if days_left < 30:
-                                    self.security_findings.append({
+                                    self._add_finding({
                                         "type": "SecOps Risk", "severity": "HIGH", "label": "SSL Certificate Expiring",
                                         "file": "Network Audit",
                                         "description": f"Certificate for {domain} expires in {days_left} days."
@@ -1,25 +1,90 @@
 import os
-import json
+import time
+import string
+import asyncio
+import logging
+from functools import lru_cache
 from typing import Dict, Any, List, Optional
+import httpx
+import orjson
 from groq import Groq
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+BATCH_POLL_INTERVAL = 30        # seconds between batch status checks
+BATCH_TIMEOUT = 30 * 60         # give up on the batch and fall back after 30 minutes
+_BATCH_TERMINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+# Keyword arguments a batch prompt may carry (those of analyze_repository)
+_PROMPT_KEYS = frozenset({"context_summary", "repo_id", "scores", "tech_recommendations"})
+
+# Parsed once at import; each audit only fills the slots.
+_AUDIT_PROMPT = string.Template("""
+You are "The Senior Global Architect" at ArchonAI. Your mission is to provide an exhaustive, high-density technical audit from A to Z. 
+
+PROJECT CONTEXT:
+$context_summary
+$tech_rec_text
+
+AUDIT METRICS:
+Overall Score: $overall_score/100
+Breakdown: $score_breakdown
+
+INSTRUCTIONS:
+1. REVIEW (A to Z): Provide a comprehensive professional assessment. Do not mention the AI model or any internal engine names.
+   - Paragraph 1: Detailed audit of the current state of the codebase. Covering everything from structure to parity.
+   - Paragraph 2: SCORE JUSTIFICATION. Explain specifically why the score of $overall_score was assigned. Reference the strengths and the specific penalties that influenced it.
+   - Paragraph 3: Strategic vision and production readiness assessment.
+2. ENGINEERING ROADMAP: Provide a list of exactly 4 detailed engineering evolution steps. Use the structured tech recommendation flags to generate specific, actionable guidance. Each step must be a full paragraph (4-5 sentences) describing what technical updates are required and exactly what tools/libraries the developer should use. Be specific: mention databases (PostgreSQL, MongoDB, etc), caching systems (Redis, Memcached), queues (Celery, Bull, Kafka), monitoring stacks (Prometheus, Datadog, New Relic), and frameworks.
+3. SUGGESTED ACTION: One major transformative shift presented as a logical, detailed recommendation paragraph. This is the most impactful architectural change for the user, grounded in the tech stack analysis.
+4. TECH STACK NOTES: For the detected tech stack, provide a brief (1-2 sentences) note for EACH specific tool/library, explaining exactly where and how it is being utilized in this specific project. Also include notes for RECOMMENDED new tools if they should be adopted based on the structured analysis.
+5. NEURAL DEBT AUDIT: Identify exactly 4 critical debt items. For each, provide an exhaustive paragraph that covers the Area, the precise technical Issue, and the long-term Business Impact. Do not truncate; be detailed.
+6. ARCHITECTURAL GRAPH EVALUATION: Provide a single paragraph evaluating the dependency relationships and modularity of the graph. This will be displayed below the graph visualization.
+7. NO SNIPPETS: Use plain, professional English. No code blocks or snippets in textual fields.
+
+OUTPUT FORMAT (JSON):
+{
+    "executive_summary": ["Paragraph 1...", "Paragraph 2...", "Paragraph 3..."],
+    "score_justification": "Detailed explanation...",
+    "engineering_roadmap": [
+        {"title": "...", "detail": "Full paragraph with specific tools/libraries..."}
+    ],
+    "suggested_action": {
+        "title": "...",
+        "paragraph": "..."
+    },
+    "tech_stack_notes": {
+        "ToolName": "Brief note on location/usage or recommended adoption..."
+    },
+    "technical_debt": [
+        {"title": "...", "paragraph": "Exhaustive paragraph..."}
+    ],
+    "graph_evaluation": "Detailed paragraph..."
+}
+""")
+
+@lru_cache(maxsize=1)
+def _get_client(api_key: str) -> Groq:
+    """Process-wide Groq client so keep-alive connections and TLS sessions are reused."""
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+    )
+    return Groq(api_key=api_key, http_client=http_client)
+
 class ArchonBrain:
     def __init__(self):
         self.api_key = os.getenv("GROQ_API_KEY")
         if self.api_key:
-            self.client = Groq(api_key=self.api_key)
+            self.client = _get_client(self.api_key)
         else:
             self.client = None
-            print("Warning: GROQ_API_KEY not found. Semantic Audit will be disabled.")
-
-    async def analyze_repository(self, context_summary: str, repo_id: str, scores: Dict[str, Any] = None, tech_recommendations: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Orchestrate LLM analysis for a repository."""
-        if not self.client:
-            return {"error": "Groq client not initialized (API Key missing)."}
+            logger.warning("GROQ_API_KEY not found. Semantic Audit will be disabled.")
 
+    def _build_request(self, context_summary: str, repo_id: str = None, scores: Dict[str, Any] = None, tech_recommendations: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Build the chat-completion request body for one repository audit."""
         overall_score = scores.get("overall_score", "Unknown") if scores else "Unknown"
         score_breakdown = scores.get("score_breakdown", {}) if scores else {}
         
@@ -45,69 +110,104 @@ class ArchonBrain:
                         elif subvalue is not None:
                             tech_rec_text += f"  - {subkey.replace('_', ' ')}: {subvalue}\n"
 
-        prompt = f"""
-You are "The Senior Global Architect" at ArchonAI. Your mission is to provide an exhaustive, high-density technical audit from A to Z. 
-
-PROJECT CONTEXT:
-{context_summary}
-{tech_rec_text}
+        prompt = _AUDIT_PROMPT.substitute(
+            context_summary=context_summary,
+            tech_rec_text=tech_rec_text,
+            overall_score=overall_score,
+            score_breakdown=score_breakdown
+        )
 
-AUDIT METRICS:
-Overall Score: {overall_score}/100
-Breakdown: {score_breakdown}
+        return {
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are a professional software architect providing structural feedback in JSON format."
+                },
+                {
+                    "role": "user",
+                    "content": prompt,
+                }
+            ],
+            "model": "llama-3.3-70b-versatile",
+            "response_format": {"type": "json_object"},
+            "temperature": 0.2,
+        }
 
-INSTRUCTIONS:
-1. REVIEW (A to Z): Provide a comprehensive professional assessment. Do not mention the AI model or any internal engine names.
-   - Paragraph 1: Detailed audit of the current state of the codebase. Covering everything from structure to parity.
-   - Paragraph 2: SCORE JUSTIFICATION. Explain specifically why the score of {overall_score} was assigned. Reference the strengths and the specific penalties that influenced it.
-   - Paragraph 3: Strategic vision and production readiness assessment.
-2. ENGINEERING ROADMAP: Provide a list of exactly 4 detailed engineering evolution steps. Use the structured tech recommendation flags to generate specific, actionable guidance. Each step must be a full paragraph (4-5 sentences) describing what technical updates are required and exactly what tools/libraries the developer should use. Be specific: mention databases (PostgreSQL, MongoDB, etc), caching systems (Redis, Memcached), queues (Celery, Bull, Kafka), monitoring stacks (Prometheus, Datadog, New Relic), and frameworks.
-3. SUGGESTED ACTION: One major transformative shift presented as a logical, detailed recommendation paragraph. This is the most impactful architectural change for the user, grounded in the tech stack analysis.
-4. TECH STACK NOTES: For the detected tech stack, provide a brief (1-2 sentences) note for EACH specific tool/library, explaining exactly where and how it is being utilized in this specific project. Also include notes for RECOMMENDED new tools if they should be adopted based on the structured analysis.
-5. NEURAL DEBT AUDIT: Identify exactly 4 critical debt items. For each, provide an exhaustive paragraph that covers the Area, the precise technical Issue, and the long-term Business Impact. Do not truncate; be detailed.
-6. ARCHITECTURAL GRAPH EVALUATION: Provide a single paragraph evaluating the dependency relationships and modularity of the graph. This will be displayed below the graph visualization.
-7. NO SNIPPETS: Use plain, professional English. No code blocks or snippets in textual fields.
+    async def analyze_repository(self, context_summary: str, repo_id: str = None, scores: Dict[str, Any] = None, tech_recommendations: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Orchestrate LLM analysis for a repository."""
+        if not self.client:
+            return {"error": "Groq client not initialized (API Key missing)."}
 
-OUTPUT FORMAT (JSON):
-{{
-    "executive_summary": ["Paragraph 1...", "Paragraph 2...", "Paragraph 3..."],
-    "score_justification": "Detailed explanation...",
-    "engineering_roadmap": [
-        {{"title": "...", "detail": "Full paragraph with specific tools/libraries..."}}
-    ],
-    "suggested_action": {{
-        "title": "...",
-        "paragraph": "..."
-    }},
-    "tech_stack_notes": {{
-        "ToolName": "Brief note on location/usage or recommended adoption..."
-    }},
-    "technical_debt": [
-        {{"title": "...", "paragraph": "Exhaustive paragraph..."}}
-    ],
-    "graph_evaluation": "Detailed paragraph..."
-}}
-"""
+        request = self._build_request(context_summary, repo_id, scores, tech_recommendations)
 
         try:
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a professional software architect providing structural feedback in JSON format."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model="llama-3.3-70b-versatile",
-                response_format={"type": "json_object"},
-                temperature=0.2,
-            )
-            return json.loads(chat_completion.choices[0].message.content)
+            chat_completion = self.client.chat.completions.create(**request)
+            return orjson.loads(chat_completion.choices[0].message.content)
         except Exception as e:
             error_msg = str(e)
             if "413" in error_msg or "rate_limit_exceeded" in error_msg:
                 return {"error": "Project context is too large for the current AI tier. Reducing the number of files or upgrading your Groq plan may help."}
             return {"error": f"LLM analysis failed: {error_msg}"}
+
+    async def analyze_repository_batch(self, prompts: List[Dict[str, Any]], poll_interval: int = BATCH_POLL_INTERVAL, timeout: int = BATCH_TIMEOUT) -> List[Dict[str, Any]]:
+        """
+        Run many audits through the Groq Batch API (lower cost, no RPM limits).
+        Each prompt holds the keyword arguments of analyze_repository. Audits the
+        batch has not delivered within `timeout` seconds fall back to the
+        synchronous endpoint, so results always line up with `prompts`.
+        """
+        # Reject malformed prompts up front, before anything is uploaded, so
+        # the synchronous fallback can't fail on them after the batch ran
+        for i, prompt in enumerate(prompts):
+            if "context_summary" not in prompt or not _PROMPT_KEYS.issuperset(prompt):
+                raise ValueError(f"Batch prompt {i} needs context_summary and only takes {sorted(_PROMPT_KEYS)}, got {sorted(prompt)}")
+
+        if not self.client:
+            return [{"error": "Groq client not initialized (API Key missing)."} for _ in prompts]
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(prompts)
+        lines = [
+            orjson.dumps({
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self._build_request(**prompt)
+            })
+            for i, prompt in enumerate(prompts)
+        ]
+
+        try:
+            batch_file = self.client.files.create(file=("audits.jsonl", b"\n".join(lines)), purpose="batch")
+            batch = self.client.batches.create(
+                completion_window="24h",
+                endpoint="/v1/chat/completions",
+                input_file_id=batch_file.id
+            )
+            deadline = time.monotonic() + timeout
+            while batch.status not in _BATCH_TERMINAL_STATES and time.monotonic() < deadline:
+                await asyncio.sleep(poll_interval)
+                batch = self.client.batches.retrieve(batch.id)
+
+            if batch.status not in _BATCH_TERMINAL_STATES:
+                logger.warning("Batch %s not finished after %ss, falling back to synchronous audits.", batch.id, timeout)
+                self.client.batches.cancel(batch.id)
+            elif batch.output_file_id:
+                output = self.client.files.content(batch.output_file_id).read()
+                for line in output.splitlines():
+                    if not line.strip():
+                        continue
+                    try:
+                        record = orjson.loads(line)
+                        response = record.get("response") or {}
+                        if response.get("status_code") == 200:
+                            content = response["body"]["choices"][0]["message"]["content"]
+                            results[int(record["custom_id"])] = orjson.loads(content)
+                    except Exception as e:
+                        logger.warning("Skipping unreadable batch result: %s", e)
+        except Exception as e:
+            logger.warning("Batch audit failed, falling back to synchronous audits: %s", e)
+
+        for i, prompt in enumerate(prompts):
+            if results[i] is None:
+                results[i] = await self.analyze_repository(**prompt)
+        return results
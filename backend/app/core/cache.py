@@ -0,0 +1,201 @@
+"""
+Persistent analysis caches.
+Reports are keyed by the repository's content (relative path + content digest
+of every indexed file) and the analyzer options, so re-analyzing an unchanged
+tree costs one hashing pass instead of the full set of layers. Reports carry
+live network checks (TLS reachability, certificate expiry), so they expire
+after _MAX_REPORT_AGE even when the tree is unchanged. Below that,
+per-file sub-analyses are memoized by content so a partially changed tree
+only re-scans the files that changed.
+"""
+
+import os
+import time
+import fcntl
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Iterable, List, Optional
+import msgpack
+import orjson
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv(
+    "ARCHON_CACHE_DIR",
+    os.path.join(os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "archon")
+)
+
+# Bump when analyzer output changes shape so stale reports are never served
+CACHE_VERSION = 1
+
+# Oldest reports are evicted beyond this many, and none is served past this age
+_MAX_REPORTS = 500
+_MAX_REPORT_AGE = 12 * 60 * 60  # seconds
+
+# Oldest per-file entries are evicted beyond this many (spread evenly over
+# the shards, one per leading hex digit pair of the content digest)
+_MAX_FILE_ENTRIES = 200_000
+_SHARD_CHARS = 2
+_SHARDS = 16 ** _SHARD_CHARS
+
+_MISSING = object()
+
+_HASH_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+def file_digest(path: str) -> str:
+    """BLAKE2b digest of a file's bytes ("" when it can't be read)."""
+    h = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    except OSError:
+        return ""
+    return h.hexdigest()
+
+def content_key(repo_path: str, relpaths: Iterable[str], opts: Dict[str, Any],
+                known: Optional[Dict[str, str]] = None,
+                reads: Callable[[str], bool] = lambda relpath: True) -> str:
+    """
+    Cache key for `repo_path`: every file's path and content hash plus the
+    options. Digests in `known` (e.g. git blob ids) are taken as given, and
+    files `reads` rejects count by path alone, so neither is read here.
+    """
+    relpaths = sorted(relpaths)
+    known = known or {}
+
+    def digest(relpath: str) -> str:
+        if relpath in known:
+            return known[relpath]
+        return file_digest(os.path.join(repo_path, relpath)) if reads(relpath) else ""
+
+    # Hashing is I/O bound; threads overlap the reads
+    with ThreadPoolExecutor(max_workers=_HASH_WORKERS) as pool:
+        digests = pool.map(digest, relpaths)
+        key = hashlib.sha256(orjson.dumps({"version": CACHE_VERSION, "opts": opts}, option=orjson.OPT_SORT_KEYS))
+        for relpath, value in zip(relpaths, digests):
+            key.update(f"{relpath}\0{value}\n".encode("utf-8", "surrogateescape"))
+    return key.hexdigest()
+
+def _entry_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """Cached report for `key`, or None on a miss (or once it has expired)."""
+    try:
+        with open(_entry_path(key), "rb") as f:
+            # mtime is when the report was written; reads don't extend it
+            if time.time() - os.fstat(f.fileno()).st_mtime > _MAX_REPORT_AGE:
+                return None
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+def _evict_reports():
+    """Delete expired reports, then the oldest beyond _MAX_REPORTS."""
+    with os.scandir(CACHE_DIR) as it:
+        reports = sorted(
+            (entry for entry in it if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+    cutoff = time.time() - _MAX_REPORT_AGE
+    expired = sum(1 for entry in reports if entry.stat().st_mtime < cutoff)
+    for entry in reports[:max(expired, len(reports) - _MAX_REPORTS)]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+def put(key: str, results: Dict[str, Any]):
+    """Store a report; the write is atomic so readers never see a partial file."""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{_entry_path(key)}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps(results))
+        os.replace(tmp, _entry_path(key))
+        _evict_reports()
+    except (OSError, TypeError) as e:
+        logger.warning("Failed to write analysis cache: %s", e)
+
+class FileAnalysisCache:
+    """
+    Content-addressed memo of per-file sub-analyses, persisted as msgpack.
+    Entries are keyed by (analysis, file name, content digest): an edited
+    file simply misses, and entries for unchanged files are reused across
+    runs and across repositories. Values must be msgpack-able (lists, not tuples).
+    The store is sharded on the digest prefix, so a save only rewrites the
+    shards that gained entries, and merges them with what other processes
+    wrote in the meantime.
+    """
+
+    def __init__(self, root: str = os.path.join(CACHE_DIR, "files")):
+        self.root = root
+        self._shards: Dict[str, Dict[str, Any]] = {}
+        self._new: Dict[str, Dict[str, Any]] = {}
+
+    def _read_shard(self, shard: str) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.root, f"{shard}.mp"), "rb") as f:
+                return msgpack.unpackb(f.read(), raw=False)
+        except Exception:
+            return {}
+
+    def _shard(self, shard: str) -> Dict[str, Any]:
+        if shard not in self._shards:
+            self._shards[shard] = self._read_shard(shard)
+        return self._shards[shard]
+
+    def memo_many(self, kind: str, names: List[str], contents: List[str],
+                  fn: Callable[[str, str], Any], mapper: Callable = map) -> List[Any]:
+        """
+        fn(name, content) for each file, served from the cache when that content
+        was seen before. Only the misses are handed to `mapper` (a map-like
+        callable), which lets the caller compute them in parallel.
+        """
+        digests = [
+            hashlib.blake2b(content.encode('utf-8', 'surrogateescape'), digest_size=16).hexdigest()
+            for content in contents
+        ]
+        keys = [f"{CACHE_VERSION}:{kind}:{name}:{digest}" for name, digest in zip(names, digests)]
+        results = [self._shard(digest[:_SHARD_CHARS]).get(key, _MISSING) for key, digest in zip(keys, digests)]
+        misses = [i for i, value in enumerate(results) if value is _MISSING]
+        if misses:
+            computed = mapper(fn, [names[i] for i in misses], [contents[i] for i in misses])
+            for i, value in zip(misses, computed):
+                shard = digests[i][:_SHARD_CHARS]
+                results[i] = self._shards[shard][keys[i]] = self._new.setdefault(shard, {})[keys[i]] = value
+        return results
+
+    def save(self):
+        """
+        Merge new entries into their shards on disk (atomically, under a lock
+        shared by every process), evicting each shard's oldest past its cap.
+        """
+        if not self._new:
+            return
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, ".lock"), "wb") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                for shard, new in self._new.items():
+                    entries = self._read_shard(shard)
+                    entries.update(new)
+                    overflow = len(entries) - _MAX_FILE_ENTRIES // _SHARDS
+                    if overflow > 0:
+                        for key in list(entries)[:overflow]:
+                            del entries[key]
+                    path = os.path.join(self.root, f"{shard}.mp")
+                    tmp = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp, "wb") as f:
+                        f.write(msgpack.packb(entries, use_bin_type=True))
+                    os.replace(tmp, path)
+                    # Pick up what other processes added to this shard
+                    self._shards[shard] = entries
+            self._new.clear()
+        except (OSError, TypeError) as e:
+            logger.warning("Failed to write file analysis cache: %s", e)
+
+# One per process, so a worker keeps its entries warm between tasks
+file_cache = FileAnalysisCache()
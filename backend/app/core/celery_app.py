@@ -14,11 +14,21 @@ celery_app = Celery(
 )
 
 celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    task_serializer="msgpack",
+    accept_content=["msgpack", "json"],  # json kept so in-flight messages still decode
+    result_serializer="msgpack",
     timezone="UTC",
     enable_utc=True,
     task_time_limit=300,        # 5 minutes (hard limit)
     task_soft_time_limit=240,   # 4 minutes (soft limit)
+    task_compression="zstd",
+    result_compression="zstd",
+    result_expires=3600,        # 1 hour
+    result_extended=False,
+    # Broker connections: long-running, bursty LLM audits
+    broker_pool_limit=50,
+    broker_connection_retry_on_startup=True,
+    broker_transport_options={"visibility_timeout": 3600, "socket_keepalive": True},
+    result_backend_transport_options={"retry_policy": {"timeout": 5.0}},
+    worker_prefetch_multiplier=1,  # audits are long; don't hoard messages
 )
@@ -0,0 +1,59 @@
+"""
+Parallel directory walker.
+Directories are listed concurrently on a thread pool, so enumeration time is
+bounded by tree depth rather than by the total number of directories, which
+matters most on network filesystems where each scandir is a round-trip.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterator, List, Optional, Tuple
+
+def _list_dir(path: str, skip: frozenset) -> Optional[Tuple[List[str], List[str], List[str]]]:
+    """(dirs, files, subdir paths to descend) for one directory, or None if unreadable."""
+    dirs, files, subdirs = [], [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    files.append(entry.name)
+                    continue
+                if entry.name in skip:
+                    continue
+                dirs.append(entry.name)
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+    except OSError:
+        return None
+    return dirs, files, subdirs
+
+def parallel_walk(top: str, skip: frozenset = frozenset(), workers: Optional[int] = None,
+                  max_pending: int = 256) -> Iterator[Tuple[str, List[str], List[str]]]:
+    """
+    os.walk-compatible (root, dirs, files) generator. Directories named in
+    `skip` are pruned before listing and symlinked directories aren't followed.
+    At most `max_pending` listings are in flight at once; triples are yielded
+    as listings complete, so their order is not deterministic.
+    """
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    queued = deque([top])
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while queued or running:
+            while queued and len(running) < max_pending:
+                path = queued.popleft()
+                running[pool.submit(_list_dir, path, skip)] = path
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                root = running.pop(future)
+                listing = future.result()
+                if listing is None:
+                    continue
+                dirs, files, subdirs = listing
+                queued.extend(subdirs)
+                yield root, dirs, files
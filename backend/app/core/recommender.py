@@ -4,49 +4,121 @@ Provides minimal structured data for recommendations.
 LLM handles all framing, explanation, and organization.
 """
 
-from typing import Dict, Any, List, Optional
+import re
+from dataclasses import dataclass, field
+from functools import partial, wraps
+from typing import Dict, Any, List, Optional, Tuple
 
+# Static payload shared by every recommendation build
+_OBSERVABILITY_COMPONENTS = ("logs", "metrics", "traces", "alerting")
+
+# Stack keywords per concern, matched against the lowercased stack
+FRAMEWORK_KWS = ("fastapi", "flask", "django", "express", "nestjs")
+PY_KWS = ("python", "fastapi", "django", "flask")
+NODE_KWS = ("express", "node", "javascript")
+CACHE_KWS = ("redis", "memcached")
+QUEUE_KWS = ("celery", "bull", "queue", "kafka", "rabbitmq")
+MON_KWS = ("prometheus", "datadog", "newrelic", "elastic")
+ML_KWS = ("tensorflow", "pytorch", "scikit-learn", "mlflow", "pandas", "numpy")
+BACKGROUND_KWS = ("worker", "scheduler", "background")
+
+# Keyword -> concerns it signals (e.g. "fastapi" is both a framework and python)
+_KEYWORD_CONCERNS: Dict[str, Tuple[str, ...]] = {}
+for _concern, _kws in (("framework", FRAMEWORK_KWS), ("python", PY_KWS), ("node", NODE_KWS),
+                       ("cache", CACHE_KWS), ("queue", QUEUE_KWS), ("monitoring", MON_KWS),
+                       ("ml", ML_KWS)):
+    for _kw in _kws:
+        _KEYWORD_CONCERNS[_kw] = _KEYWORD_CONCERNS.get(_kw, ()) + (_concern,)
+
+# One pass over the stack finds every keyword: the zero-width lookahead is tried
+# at each position, so overlapping hits are all reported. Longest-first ordering
+# only matters for keywords sharing a start, and none is a prefix of another.
+_KEYWORD_SCAN = re.compile(
+    "(?=(" + "|".join(map(re.escape, sorted(_KEYWORD_CONCERNS, key=len, reverse=True))) + "))"
+)
+
+# Per-item framework filter for the "current" list, compiled once at import
+_FRAMEWORK_RE = re.compile("|".join(map(re.escape, FRAMEWORK_KWS)))
+
+
+def _memoized(method):
+    """Cache a zero-argument helper's result on the instance after its first call."""
+    @wraps(method)
+    def wrapper(self):
+        try:
+            return self._memo[method.__name__]
+        except KeyError:
+            value = self._memo[method.__name__] = method(self)
+            return value
+    return wrapper
+
+
+@dataclass(frozen=True, slots=True, eq=False)
 class TechStackRecommender:
     """Generates minimal structured recommendation data for LLM processing."""
     
-    def __init__(self, static_findings: Dict[str, Any], structural_findings: Dict[str, Any], 
-                 score: int, security_findings: List[Dict[str, Any]]):
-        self.static_findings = static_findings
-        self.structural_findings = structural_findings
-        self.score = score
-        self.security_findings = security_findings
-        self.stack = static_findings.get("stack", [])
-        self.categories = static_findings.get("categories", {})
+    static_findings: Dict[str, Any]
+    structural_findings: Dict[str, Any]
+    score: int
+    security_findings: List[Dict[str, Any]]
+    stack: List[str] = field(init=False)
+    categories: Dict[str, List[str]] = field(init=False)
+    _stack_lc: str = field(init=False)
+    _cat_blob: str = field(init=False)
+    _cat_lc: str = field(init=False)
+    _hits: frozenset = field(init=False)
+    _memo: Dict[str, bool] = field(init=False)
+    _cached: Optional[Dict[str, Any]] = field(init=False)
+
+    def __post_init__(self):
+        # Frozen: derived state has to bypass the generated __setattr__
+        init = partial(object.__setattr__, self)
+        init("stack", self.static_findings.get("stack", []))
+        init("categories", self.static_findings.get("categories", {}))
+        # Stringify once; every keyword check below scans these blobs
+        init("_stack_lc", " ".join(map(str, self.stack)).lower())
+        init("_cat_blob", str(self.categories))
+        init("_cat_lc", self._cat_blob.lower())
+        init("_hits", frozenset(
+            concern
+            for match in _KEYWORD_SCAN.finditer(self._stack_lc)
+            for concern in _KEYWORD_CONCERNS[match.group(1)]
+        ))
+        init("_memo", {})
+        init("_cached", None)
     
     def generate_recommendations(self) -> Dict[str, Any]:
         """Generate minimal structured recommendation data for LLM framing."""
-        return {
-            "frameworks": self._frameworks_data(),
-            "databases": self._databases_data(),
-            "caching": self._caching_data(),
-            "queues": self._queues_data(),
-            "monitoring": self._monitoring_data(),
-            "ml": self._ml_data() if self._detect_ml() else None,
-            "observability": self._observability_data(),
-            "project_context": {
-                "score": self.score,
-                "stack": self.stack,
-                "categories": self.categories,
-                "has_ml": self._detect_ml(),
-                "is_microservices_candidate": self._is_microservices_candidate(),
-                "should_cache": self._should_recommend_caching(),
-                "is_high_traffic": self._is_high_traffic(),
-                "has_background_tasks": self._has_background_tasks(),
-                "is_event_driven": self._is_event_driven()
-            }
+        if self._cached is None:
+            object.__setattr__(self, "_cached", self._build_recommendations())
+        return self._cached
+
+    def _build_recommendations(self) -> Dict[str, Any]:
+        """Build the recommendation payload from the current findings."""
+        has_ml = self._detect_ml()
+        payload = {
+            key: build(self) if requires is None or requires in self._hits else None
+            for key, build, requires in self._SECTIONS
         }
+        payload["project_context"] = {
+            "score": self.score,
+            "stack": self.stack,
+            "categories": self.categories,
+            "has_ml": has_ml,
+            "is_microservices_candidate": self._is_microservices_candidate(),
+            "should_cache": self._should_recommend_caching(),
+            "is_high_traffic": self._is_high_traffic(),
+            "has_background_tasks": self._has_background_tasks(),
+            "is_event_driven": self._is_event_driven()
+        }
+        return payload
     
     def _frameworks_data(self) -> Dict[str, Any]:
         """Return minimal framework data for LLM to frame."""
         return {
-            "current": list(filter(lambda x: any(y in x.lower() for y in ["fastapi", "flask", "django", "express", "nestjs"]), self.stack)),
-            "python_stack": any(x in str(self.stack).lower() for x in ["python", "fastapi", "django", "flask"]),
-            "node_stack": any(x in str(self.stack).lower() for x in ["express", "node", "javascript"]),
+            "current": [x for x in self.stack if _FRAMEWORK_RE.search(x.lower())],
+            "python_stack": "python" in self._hits,
+            "node_stack": "node" in self._hits,
             "has_microservices": self._is_microservices_candidate()
         }
     
@@ -63,7 +135,7 @@ class TechStackRecommender:
     def _caching_data(self) -> Dict[str, Any]:
         """Return minimal caching data for LLM to frame."""
         return {
-            "detected": any(x in str(self.stack).lower() for x in ["redis", "memcached"]),
+            "detected": "cache" in self._hits,
             "should_recommend": self._should_recommend_caching(),
             "is_high_traffic": self._is_high_traffic(),
             "score": self.score
@@ -72,7 +144,7 @@ class TechStackRecommender:
     def _queues_data(self) -> Dict[str, Any]:
         """Return minimal queue data for LLM to frame."""
         return {
-            "detected": any(x in str(self.stack).lower() for x in ["celery", "bull", "queue", "kafka", "rabbitmq"]),
+            "detected": "queue" in self._hits,
             "has_background_tasks": self._has_background_tasks(),
             "is_event_driven": self._is_event_driven()
         }
@@ -80,7 +152,7 @@ class TechStackRecommender:
     def _monitoring_data(self) -> Dict[str, Any]:
         """Return minimal monitoring data for LLM to frame."""
         return {
-            "detected": any(x in str(self.stack).lower() for x in ["prometheus", "datadog", "newrelic", "elastic"]),
+            "detected": "monitoring" in self._hits,
             "score": self.score,
             "needs_enterprise": self.score >= 80
         }
@@ -96,33 +168,51 @@ class TechStackRecommender:
     def _observability_data(self) -> Dict[str, Any]:
         """Return minimal observability stack data for LLM to frame."""
         return {
-            "components": ["logs", "metrics", "traces", "alerting"],
+            "components": list(_OBSERVABILITY_COMPONENTS),
             "score": self.score
         }
     
+    # Payload sections in output order: (key, builder, concern the stack must
+    # show for the section to be built, else None). Sections whose concern is
+    # missing are reported as None without running their builder.
+    _SECTIONS = (
+        ("frameworks", _frameworks_data, None),
+        ("databases", _databases_data, None),
+        ("caching", _caching_data, None),
+        ("queues", _queues_data, None),
+        ("monitoring", _monitoring_data, None),
+        ("ml", _ml_data, "ml"),
+        ("observability", _observability_data, None),
+    )
+
     # Helper methods
+    @_memoized
     def _detect_ml(self) -> bool:
         """Check if project includes ML components."""
-        ml_indicators = ["tensorflow", "pytorch", "scikit-learn", "mlflow", "pandas", "numpy"]
-        return any(x in str(self.stack).lower() for x in ml_indicators)
+        return "ml" in self._hits
     
+    @_memoized
     def _is_microservices_candidate(self) -> bool:
         """Check if project should adopt microservices."""
         return self.score > 70 and self.structural_findings.get("modularity_score", 0) > 60
     
+    @_memoized
     def _should_recommend_caching(self) -> bool:
         """Determine if caching is critical."""
         categories = self.categories.get("Database", [])
         return len(categories) > 0 and self.score > 50
     
+    @_memoized
     def _is_high_traffic(self) -> bool:
         """Check for high-traffic indicators."""
-        return self.score > 85 and "API" in str(self.categories)
+        return self.score > 85 and "API" in self._cat_blob
     
+    @_memoized
     def _has_background_tasks(self) -> bool:
         """Check for background task patterns."""
-        return any(x in str(self.categories).lower() for x in ["worker", "scheduler", "background"])
+        return any(k in self._cat_lc for k in BACKGROUND_KWS)
     
+    @_memoized
     def _is_event_driven(self) -> bool:
         """Check for event-driven architecture patterns."""
         return self.structural_findings.get("concerns_separation", "").lower() == "high"
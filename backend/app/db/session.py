@@ -1,5 +1,6 @@
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from functools import lru_cache
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from dotenv import load_dotenv
 
@@ -10,14 +11,31 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL is not set in environment variables")
 
-from sqlalchemy.pool import NullPool
-
-engine = create_async_engine(DATABASE_URL, echo=False, poolclass=NullPool)
-AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+# Pools are per process (API server, each Celery child); size them via env.
+# The engine is built on first use, so a prefork parent never opens a
+# connection and each child creates its own pool after the fork.
+@lru_cache(maxsize=1)
+def get_engine() -> AsyncEngine:
+    return create_async_engine(
+        DATABASE_URL,
+        echo=False,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_pre_ping=True,
+        pool_recycle=1800,
+    )
+
+@lru_cache(maxsize=1)
+def get_sessionmaker() -> async_sessionmaker:
+    return async_sessionmaker(get_engine(), class_=AsyncSession, expire_on_commit=False)
+
+def AsyncSessionLocal() -> AsyncSession:
+    """Open a session on this process's engine."""
+    return get_sessionmaker()()
 
 async def dispose_engine():
-    """Dispose of the global engine pool."""
-    await engine.dispose()
+    """Dispose of the process engine pool."""
+    await get_engine().dispose()
 
 class Base(DeclarativeBase):
     pass
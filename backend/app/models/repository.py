@@ -1,7 +1,7 @@
 import uuid
 import enum
-from sqlalchemy import Column, String, Enum, DateTime, func, JSON, Integer
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Enum, DateTime, func, JSON, Integer, Index
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 from app.db.session import Base
 
 class RepositoryStatus(str, enum.Enum):
@@ -12,13 +12,20 @@ class RepositoryStatus(str, enum.Enum):
 
 class Repository(Base):
     __tablename__ = "repositories"
+    __table_args__ = (
+        # Listing repositories by status, newest first
+        Index("ix_repo_status_created", "status", "created_at"),
+        # Score thresholds and containment (@>) filters on the stored report
+        Index("ix_repo_score", "overall_score"),
+        Index("ix_repo_results_gin", "analysis_results", postgresql_using="gin"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     url = Column(String, unique=True, index=True, nullable=False)
     name = Column(String, nullable=True)
     status = Column(Enum(RepositoryStatus), default=RepositoryStatus.PENDING, nullable=False)
     local_path = Column(String, nullable=True)
-    analysis_results = Column(JSON, nullable=True)
+    analysis_results = Column(JSONB, nullable=True)
     overall_score = Column(Integer, default=0)
     logs = Column(JSON, default=list)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, HttpUrl, UUID4
+from pydantic import BaseModel, ConfigDict, HttpUrl, UUID4, field_validator
 from datetime import datetime
 from enum import Enum
 from typing import Optional
@@ -21,6 +21,8 @@ class RepositoryUpdate(BaseModel):
     name: Optional[str] = None
 
 class RepositoryResponse(RepositoryBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: UUID4
     name: Optional[str] = None
     status: RepositoryStatus
@@ -32,12 +34,8 @@ class RepositoryResponse(RepositoryBase):
     # Return URL as string for easier serialization
     url: str 
 
-    class Config:
-        from_attributes = True
-
+    @field_validator("url", mode="before")
     @classmethod
-    def from_orm(cls, obj):
-        # Ensure URL is converted to string if it's not already
-        if hasattr(obj, 'url'):
-            obj.url = str(obj.url)
-        return super().from_orm(obj)
+    def _url_to_str(cls, v):
+        # Coerce on read instead of writing back to the ORM object
+        return str(v)
@@ -1,63 +1,165 @@
 import asyncio
 import subprocess
 import os
-from sqlalchemy.future import select
+from typing import Optional, List
+from sqlalchemy import select, update, bindparam, cast, func, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from celery.signals import worker_process_init
 from app.core.celery_app import celery_app
 from app.models.repository import Repository, RepositoryStatus
-from app.db.session import AsyncSessionLocal, engine
+from app.db.session import AsyncSessionLocal
 from app.core.analyzer import RepositoryAnalyzer
+from app.core.brain import ArchonBrain, BATCH_TIMEOUT
 from celery.exceptions import SoftTimeLimitExceeded
 
+# Progress messages arriving within this window are written in one UPDATE
+_LOG_COALESCE = 0.2  # seconds
+
+# Statements built once per process; each call only binds the repo id
+_UPDATE_REPO = (
+    update(Repository)
+    .where(Repository.id == bindparam("repo_id"))
+    .execution_options(synchronize_session=False)
+)
+_SELECT_RESULTS = select(Repository.analysis_results).where(Repository.id == bindparam("repo_id"))
+
+# One event loop per worker process. asyncpg connections are bound to the loop
+# that opened them, so reusing it lets the engine keep a real connection pool.
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _LOOP
+    if _LOOP is None or _LOOP.is_closed():
+        _LOOP = asyncio.new_event_loop()
+        asyncio.set_event_loop(_LOOP)
+    return _LOOP
+
+def _run(coro):
+    """
+    Run a coroutine to completion on the worker's persistent loop. If it is
+    interrupted (e.g. by SoftTimeLimitExceeded), it and every task it spawned
+    are cancelled before re-raising, so nothing resumes during a later task.
+    """
+    loop = _get_loop()
+    task = loop.create_task(coro)
+    try:
+        return loop.run_until_complete(task)
+    except BaseException:
+        task.cancel()
+        loop.run_until_complete(asyncio.gather(task, return_exceptions=True))
+        leftover = asyncio.all_tasks(loop)
+        for t in leftover:
+            t.cancel()
+        loop.run_until_complete(asyncio.gather(*leftover, return_exceptions=True))
+        raise
+
 @worker_process_init.connect
 def init_worker(**kwargs):
     """
     Called when a new worker process starts (prefork).
-    We dispose of the engine inherited from the parent process
-    to ensure each child starts with its own fresh pool.
+    Creates the process's event loop; the DB engine is built lazily on the
+    first session, so nothing inherited from the parent needs disposing.
     """
-    import asyncio
-    try:
-        # Use sync dispose for the engine pool if possible, but for asyncpg/asyncio
-        # it's safer to just let the pool be recreated on first use in the child.
-        # SQLAlchemy's engine.dispose() is actually async for AsyncEngine.
-        # Since this signal is sync, we use a small bridge.
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            asyncio.ensure_future(engine.dispose())
-        else:
-            asyncio.run(engine.dispose())
-    except Exception as e:
-        print(f"Error disposing engine in worker init: {e}")
+    _get_loop()
+
+async def update_status(repo_id, status, local_path=None, analysis_results=None, overall_score=0, log_message=None, log_messages: Optional[List[str]] = None):
+    """Update a repository row; a `status` of None only appends to its logs."""
+    values = {}
+    if status is not None:
+        values["status"] = status
+    if local_path:
+        values["local_path"] = local_path
+    if analysis_results:
+        values["analysis_results"] = analysis_results
+        values["overall_score"] = overall_score
+    new_logs = list(log_messages or [])
+    if log_message:
+        new_logs.append(log_message)
+    if new_logs:
+        # Append server-side; json has no || operator, so concatenate as jsonb
+        values["logs"] = cast(
+            func.coalesce(cast(Repository.logs, JSONB), cast([], JSONB)).op("||")(cast(new_logs, JSONB)),
+            JSON
+        )
+    if not values:
+        return
+    async with AsyncSessionLocal() as session:
+        await session.execute(_UPDATE_REPO.values(**values), {"repo_id": repo_id})
+        await session.commit()
 
-async def update_status(repo_id, status, local_path=None, analysis_results=None, overall_score=0, log_message=None):
+async def get_analysis_results(repo_id):
     async with AsyncSessionLocal() as session:
-        result = await session.execute(select(Repository).where(Repository.id == repo_id))
-        repo = result.scalars().first()
-        if repo:
-            repo.status = status
-            if local_path:
-                repo.local_path = local_path
-            if analysis_results:
-                repo.analysis_results = analysis_results
-                repo.overall_score = overall_score
-            if log_message:
-                if repo.logs is None: repo.logs = []
-                # Append log message
-                new_logs = list(repo.logs)
-                new_logs.append(log_message)
-                repo.logs = new_logs
-            await session.commit()
-
-@celery_app.task
+        result = await session.execute(_SELECT_RESULTS, {"repo_id": repo_id})
+        return result.scalar_one_or_none()
+
+async def _drain_logs(log_q: asyncio.Queue, repo_id):
+    """Write queued progress messages, coalescing each burst into a single UPDATE."""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await log_q.get()]
+        deadline = loop.time() + _LOG_COALESCE
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                batch.append(await asyncio.wait_for(log_q.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        try:
+            # Logs only: a late batch must never overwrite a final status
+            await update_status(repo_id, None, log_messages=batch)
+        except Exception as e:
+            print(f"Failed to log progress: {e}")
+        finally:
+            for _ in batch:
+                log_q.task_done()
+
+async def _analyze(repo_id, target_dir):
+    """
+    Run the analyzer with its progress log pumped into the DB by a background
+    writer, so analysis never waits on a database round-trip.
+    """
+    loop = asyncio.get_running_loop()
+    log_q: asyncio.Queue = asyncio.Queue()
+    writer = asyncio.create_task(_drain_logs(log_q, repo_id))
+
+    def on_progress(msg):
+        # Layers log from the analyzer's worker thread; the queue belongs to the loop
+        loop.call_soon_threadsafe(log_q.put_nowait, msg)
+
+    try:
+        analyzer = RepositoryAnalyzer(target_dir, on_progress=on_progress)
+        return await analyzer.analyze()
+    finally:
+        # Let messages handed over just now reach the queue, then flush them
+        # (including on failure) before the final status
+        try:
+            await asyncio.sleep(0)
+            await log_q.join()
+        finally:
+            writer.cancel()
+
+def _remote_head(clone_url) -> Optional[str]:
+    """SHA of the remote HEAD, or None when it can't be resolved."""
+    try:
+        out = subprocess.run(
+            ["git", "ls-remote", clone_url, "HEAD"],
+            check=True,
+            capture_output=True,
+            text=True,
+            timeout=30,
+            env={**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+        ).stdout.split()
+    except (subprocess.SubprocessError, OSError):
+        return None
+    return out[0] if out else None
+
+@celery_app.task(ignore_result=True)
 def clone_repository(repo_id, url, github_token=None):
     """
     Background task to clone a repository.
     Strictly uses synchronous subprocess for git (blocking) 
-    and asyncio.run for DB updates.
+    and the worker's persistent event loop for DB updates.
     """
     # ... (status updates omitted for brevity)
-    
     try:
         # ...
         target_dir = f"/app/repos/{repo_id}"
@@ -68,37 +170,38 @@ def clone_repository(repo_id, url, github_token=None):
             # Inject token into URL: https://x-access-token:<token>@github.com/owner/repo
             token_url = url.replace("https://", f"https://x-access-token:{github_token}@")
             clone_url = token_url
+
+        # Skip clone + analysis when nothing was pushed since the last audit
+        head_sha = _remote_head(clone_url)
+        previous = _run(get_analysis_results(repo_id)) if head_sha else None
+        if previous and previous.get("head_sha") == head_sha and "error" not in (previous.get("ai_analysis") or {}):
+            _run(update_status(
+                repo_id,
+                RepositoryStatus.COMPLETED,
+                log_message=f"System: No new commits since the last audit ({head_sha[:7]}). Reusing previous report."
+            ))
+            return f"Reused analysis of {url} at {head_sha[:7]}"
             
-        # Run git clone
-        subprocess.check_call(["git", "clone", clone_url, target_dir])
+        # Shallow clone: the analysis only needs the working tree, not history
+        subprocess.run(
+            ["git", "clone", "--depth=1", "--single-branch", "--no-tags", clone_url, target_dir],
+            check=True,
+            capture_output=True,
+            text=True,
+            env={**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+        )
         
         # 3. Enhanced Analysis with live logging
-        def on_analysis_progress(msg):
-            try:
-                # Use the current event loop if it's already running
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    loop.create_task(update_status(repo_id, RepositoryStatus.CLONING, log_message=msg))
-                else:
-                    asyncio.run(update_status(repo_id, RepositoryStatus.CLONING, log_message=msg))
-            except Exception as e:
-                # Fallback: create a new loop if get_event_loop fails
-                try:
-                    new_loop = asyncio.new_event_loop()
-                    new_loop.run_until_complete(update_status(repo_id, RepositoryStatus.CLONING, log_message=msg))
-                    new_loop.close()
-                except:
-                    print(f"Failed to log progress: {e}")
-
-        asyncio.run(update_status(repo_id, RepositoryStatus.CLONING, log_message="System: Repository cloned. Starting analysis engine..."))
+        _run(update_status(repo_id, RepositoryStatus.CLONING, log_message="System: Repository cloned. Starting analysis engine..."))
         
-        analyzer = RepositoryAnalyzer(target_dir, on_progress=on_analysis_progress)
-        analysis_results = asyncio.run(analyzer.analyze())
+        analysis_results = _run(_analyze(repo_id, target_dir))
         
         print(f"Analysis for {repo_id}: Score {analysis_results.get('overall_score')}")
+        if head_sha:
+            analysis_results["head_sha"] = head_sha
 
         # 4. Update to COMPLETED
-        asyncio.run(update_status(
+        _run(update_status(
             repo_id, 
             RepositoryStatus.COMPLETED, 
             local_path=target_dir,
@@ -110,20 +213,38 @@ def clone_repository(repo_id, url, github_token=None):
 
     except SoftTimeLimitExceeded:
         print(f"Soft time limit exceeded for repository {url}")
-        asyncio.run(update_status(
+        _run(update_status(
             repo_id, 
             RepositoryStatus.FAILED, 
             log_message="System: Analysis timeout. Project is too large or complex for the current processing window."
         ))
         return f"Timeout analyzing {url}"
 
+    except subprocess.CalledProcessError as e:
+        # Surface git's own message rather than the (token-bearing) command line
+        error = e.stderr.strip() if e.stderr else f"git exited with status {e.returncode}"
+        print(f"Error cloning repository {url}: {error}")
+        _run(update_status(repo_id, RepositoryStatus.FAILED, log_message=f"System Error: {error}"))
+        return f"Failed to clone: {error}"
+
     except Exception as e:
         print(f"Error cloning repository {url}: {e}")
-        asyncio.run(update_status(repo_id, RepositoryStatus.FAILED, log_message=f"System Error: {str(e)}"))
+        _run(update_status(repo_id, RepositoryStatus.FAILED, log_message=f"System Error: {str(e)}"))
         return f"Failed to clone: {e}"
 
-@celery_app.task
+@celery_app.task(time_limit=BATCH_TIMEOUT + 1800, soft_time_limit=BATCH_TIMEOUT + 1500)
+def run_batch_audit(prompts):
+    """
+    Non-interactive audits (CI sweeps, nightly re-audits) routed through the
+    Groq Batch API. Each prompt carries the analyze_repository arguments; the
+    time limits leave room for the synchronous fallback after the batch window.
+    """
+    brain = ArchonBrain()
+    return _run(brain.analyze_repository_batch(prompts))
+
+@celery_app.task(ignore_result=True)
 def test_task(word: str):
-    import time
-    time.sleep(5)
+    """Smoke-test task; a no-op unless ALLOW_TEST_TASKS=1."""
+    if os.getenv("ALLOW_TEST_TASKS") != "1":
+        return "disabled"
     return f"Processed: {word}"
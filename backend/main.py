@@ -1,14 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from app.db.session import engine, Base
+from app.db.session import get_engine, Base
 # Import all models so they are registered with Base.metadata
 from app.models.repository import Repository 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Create tables
-    async with engine.begin() as conn:
+    async with get_engine().begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     yield
     # Shutdown
@@ -1,26 +1,35 @@
-from app.core.analyzer import RepositoryAnalyzer
-import json
+import asyncio
+import re
+import orjson
 import os
 
-def verify_security_scan():
+# Roadmap steps that concern security, matched in one pass over the title
+SECURITY_STEP = re.compile("Security|Rotation|Injection")
+
+async def verify_security_scan():
+    from app.core.analyzer import RepositoryAnalyzer
+
     repo_path = "/tmp/vulnerable_repo"
-    analyzer = RepositoryAnalyzer(repo_path)
-    results = analyzer.analyze()
-    
+
+    def on_finding(find):
+        print(f"[{find['severity']}] {find['type']}: {find['label']} in {find['file']}")
+
     print("--- Security Sweep Results ---")
-    print(f"Overall Score: {results['overall_score']}")
-    print(f"Maturity Label: {results['maturity_label']}")
     print("\nSecurity Findings:")
-    for find in results['security_findings']:
-        print(f"[{find['severity']}] {find['type']}: {find['label']} in {find['file']}")
+    # Findings are printed as the scan produces them
+    analyzer = RepositoryAnalyzer(repo_path, on_finding=on_finding)
+    results = await analyzer.analyze()
+
+    print(f"\nOverall Score: {results['overall_score']}")
+    print(f"Maturity Label: {results['maturity_label']}")
     
     print("\nScore Breakdown:")
-    print(json.dumps(results['score_breakdown'], indent=2))
+    print(orjson.dumps(results['score_breakdown'], option=orjson.OPT_INDENT_2).decode())
     
     print("\nActionable Roadmap (Security):")
     for step in results['actionable_roadmap']:
-        if "Security" in step['title'] or "Rotation" in step['title'] or "Injection" in step['title']:
+        if SECURITY_STEP.search(step['title']):
             print(f"- {step['title']}: {step['action']}")
 
 if __name__ == "__main__":
-    verify_security_scan()
+    asyncio.run(verify_security_scan())